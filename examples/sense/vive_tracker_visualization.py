@@ -4,6 +4,9 @@
 """
 Vive Tracker模块 - 获取设备的位姿数据并用Pygame实时可视化
 此示例是为了用户更好的观察设备定位是否有漂移
+
+依赖: pygame (必需)，numba (可选，建议安装: pip3 install numba)
+未安装numba时坐标系计算以普通Python运行，速度会变慢
 """
 
 import sys
@@ -13,16 +16,67 @@ import logging
 import numpy as np
 import pygame
 import math
+from collections import OrderedDict
+
+try:
+    from numba import njit
+    _HAS_NUMBA = True
+except ImportError:
+    _HAS_NUMBA = False
+    # 未安装numba时退化为普通Python函数
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda func: func
 
 # 配置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger('vive_tracker_visualization')
+if not _HAS_NUMBA:
+    logger.warning("未找到numba库，坐标系计算将以普通Python运行，建议安装: pip3 install numba")
+
+@njit(cache=True)
+def _rotate_basis(q, length, out):
+    """
+    用四元数直接旋转三个基向量: v' = v + w*t + u x t, 其中 t = 2 * (u x v)
+    out[i] 为旋转后的第i个基向量乘以 length（即旋转矩阵第i列 * length）
+    """
+    x, y, z, w = q[0], q[1], q[2], q[3]
+    # e_x = (1, 0, 0): t = 2 * (0, z, -y)
+    t1, t2 = 2*z, -2*y
+    out[0, 0] = (1 + y*t2 - z*t1) * length
+    out[0, 1] = (w*t1 - x*t2) * length
+    out[0, 2] = (w*t2 + x*t1) * length
+    # e_y = (0, 1, 0): t = 2 * (-z, 0, x)
+    t0, t2 = -2*z, 2*x
+    out[1, 0] = (w*t0 + y*t2) * length
+    out[1, 1] = (1 + z*t0 - x*t2) * length
+    out[1, 2] = (w*t2 - y*t0) * length
+    # e_z = (0, 0, 1): t = 2 * (y, -x, 0)
+    t0, t1 = 2*y, -2*x
+    out[2, 0] = (w*t0 - z*t1) * length
+    out[2, 1] = (w*t1 + z*t0) * length
+    out[2, 2] = (1 + x*t1 - y*t0) * length
+    return out
 
 # --- Pygame 可视化类 ---
 class PygameVisualizer:
+    TEXT_CACHE_SIZE = 256     # 文字缓存的最大条目数
+    INFO_TEXT_INTERVAL = 3    # 位姿信息文字的刷新间隔(帧)
+    AXIS_COLORS = ((255, 0, 0), (0, 255, 0), (0, 0, 255))  # X轴-红 Y轴-绿 Z轴-蓝
+    POSITION_EPSILON = 1e-4   # 位置变化小于此值(m)视为静止
+    ROTATION_EPSILON = 1e-7   # 1-|q·q_last| 小于此值视为姿态未变 (约0.05°)
+    REDRAW_INTERVAL = 0.1     # 静止时的最长重绘间隔(s)
+    # 窗口重新露出的事件 (pygame 1 只有 VIDEOEXPOSE)，需要整屏刷新
+    EXPOSE_EVENTS = tuple(getattr(pygame, name) for name in ("VIDEOEXPOSE", "WINDOWEXPOSED") if hasattr(pygame, name))
+    HANDLED_EVENTS = (pygame.QUIT, pygame.KEYDOWN) + EXPOSE_EVENTS  # 需要处理的事件
+
     def __init__(self, width=800, height=600):
         try:
             pygame.init()
+            # 只保留需要处理的事件，其余事件在SDL层直接丢弃
+            pygame.event.set_blocked(None)
+            pygame.event.set_allowed(list(self.HANDLED_EVENTS))
             self.screen = pygame.display.set_mode((width, height))
             pygame.display.set_caption("Vive Tracker Pose Visualization")
             self.clock = pygame.time.Clock()
@@ -36,6 +90,32 @@ class PygameVisualizer:
         self.camera_distance = 5.0  # 离z=0平面的距离
         self.scale_factor = 2000.0   # 投影缩放因子，用于缩放视图
         self.zoom_step = 100.0       # 每次缩放的调整量
+
+        # 预分配四元数/坐标轴缓冲区，避免每帧重新创建数组
+        self._q = np.empty(4)
+        self._axes = np.empty((3, 3))
+        self._pts = np.empty((4, 3))
+        # 预热一次，避免第一帧触发JIT编译造成卡顿
+        self._q[:] = (0.0, 0.0, 0.0, 1.0)
+        _rotate_basis(self._q, 1.0, self._axes)
+
+        # 静态背景缓存 (Base Link 坐标系 + 缩放提示)，缩放改变时才重新绘制
+        self._base_pos = [0.0, 0.0, 0.0]
+        self._base_quat = [0.0, 0.0, 0.0, 1.0]
+        self._I = np.eye(3)
+        self._base_pos_2d = None  # Base Link 原点的屏幕坐标，随背景一起更新
+        self._bg = None
+        self._bg_dirty = True  # 缩放改变或窗口重新露出后需要重新绘制背景并整屏刷新
+        self._dirty_rects = []  # 上一帧动态内容覆盖的区域
+        self._text_cache = OrderedDict()  # 静态文字(坐标系名称、缩放提示)渲染结果LRU缓存
+        self._frame_count = 0
+        self._info_surfaces = None  # 位姿信息文字，每 INFO_TEXT_INTERVAL 帧更新一次
+        # 上一次实际绘制时的位姿，用于跳过静止时的重绘
+        self._last_pos = None
+        self._last_rot = None
+        self._last_draw_time = 0.0
+        if self.running:
+            self._bg = pygame.Surface((width, height)).convert()
         
     def project_3d_to_2d(self, point_3d):
         """将3D点投影到2D屏幕"""
@@ -51,19 +131,17 @@ class PygameVisualizer:
         x_2d = 400 + x * factor
         y_2d = 300 - y * factor 
         return (int(x_2d), int(y_2d))
+
+    def project_points(self, pts):
+        """将 (N, 3) 的3D点批量投影到2D屏幕，返回 (N, 2) 的整数坐标"""
+        # 避免除以零或负值
+        depth = np.maximum(pts[:, 2] + self.camera_distance, 0.1)
+        factor = self.scale_factor / depth
+        xs = 400 + pts[:, 0] * factor
+        ys = 300 - pts[:, 1] * factor
+        return np.stack([xs, ys], 1).astype(np.int32)
     
-    def quaternion_to_rotation_matrix(self, quaternion):
-        """将 [x, y, z, w] 四元数转换为 3x3 旋转矩阵"""
-        q1, q2, q3, q0 = quaternion # 对应 (x, y, z, w)
-        
-        R = np.array([
-            [1-2*(q2**2+q3**2), 2*(q1*q2-q0*q3), 2*(q1*q3+q0*q2)],
-            [2*(q1*q2+q0*q3), 1-2*(q1**2+q3**2), 2*(q2*q3-q0*q1)],
-            [2*(q1*q3-q0*q2), 2*(q2*q3+q0*q1), 1-2*(q1**2+q2**2)]
-        ])
-        return R
-
-    def draw_coordinate_frame(self, position, quaternion, color, length, name=""):
+    def draw_coordinate_frame(self, position, quaternion, color, length, name="", surface=None):
         """
         绘制一个坐标系
         :param position: 坐标系原点 [x, y, z]
@@ -71,76 +149,126 @@ class PygameVisualizer:
         :param color: 轴颜色 (R, G, B)
         :param length: 轴的长度
         :param name: 坐标系名称，用于显示
+        :param surface: 绘制目标，默认为屏幕
+        :return: 本次绘制覆盖的区域 pygame.Rect
         """
-        # 四元数转旋转矩阵
-        R = self.quaternion_to_rotation_matrix(quaternion)
-        
-        # 坐标系轴
-        pos_np = np.array(position)
-        x_end = pos_np + R[:, 0] * length
-        y_end = pos_np + R[:, 1] * length
-        z_end = pos_np + R[:, 2] * length
+        if surface is None:
+            surface = self.screen
+
+        if quaternion is self._base_quat:
+            # Base Link 无旋转，各轴方向即单位矩阵
+            axes = np.multiply(self._I, length, out=self._axes)
+        else:
+            # 四元数直接旋转三个基向量，得到各轴方向 * length
+            self._q[:] = quaternion
+            axes = _rotate_basis(self._q, float(length), self._axes)
         
-        # 投影到2D
-        pos_2d = self.project_3d_to_2d(pos_np)
-        x_end_2d = self.project_3d_to_2d(x_end)
-        y_end_2d = self.project_3d_to_2d(y_end)
-        z_end_2d = self.project_3d_to_2d(z_end)
+        # 原点 + 三个轴端点，一次性批量投影到2D
+        pts = self._pts
+        pts[0] = position
+        pts[1:] = pts[0] + axes
+        pos_2d, *ends_2d = self.project_points(pts).tolist()
         
-        # 绘制轴线 (使用传入的颜色)
-        pygame.draw.line(self.screen, (255, 0, 0), pos_2d, x_end_2d, 3)  # X轴-红
-        pygame.draw.line(self.screen, (0, 255, 0), pos_2d, y_end_2d, 3)  # Y轴-绿
-        pygame.draw.line(self.screen, (0, 0, 255), pos_2d, z_end_2d, 3)  # Z轴-蓝
+        # 绘制轴线
+        rect = pygame.Rect(pos_2d, (0, 0))
+        for axis_color, end_2d in zip(self.AXIS_COLORS, ends_2d):
+            rect.union_ip(pygame.draw.line(surface, axis_color, pos_2d, end_2d, 3))
 
         # 绘制原点
-        pygame.draw.circle(self.screen, color, pos_2d, 5)
+        rect.union_ip(pygame.draw.circle(surface, color, pos_2d, 5))
         
         # 显示坐标系名称
         if name:
-            text_surface = self.font.render(name, True, color)
-            self.screen.blit(text_surface, (pos_2d[0] + 10, pos_2d[1] - 10))
+            text_surface = self._render_text(name, color)
+            rect.union_ip(surface.blit(text_surface, (pos_2d[0] + 10, pos_2d[1] - 10)))
+        return rect
+
+    def _render_text(self, text, color):
+        """渲染文字，相同的文字只光栅化一次，并转换为与屏幕一致的像素格式"""
+        key = (text, color)
+        surface = self._text_cache.get(key)
+        if surface is None:
+            surface = self.font.render(text, True, color).convert_alpha()
+            self._text_cache[key] = surface
+            if len(self._text_cache) > self.TEXT_CACHE_SIZE:
+                self._text_cache.popitem(last=False)
+        else:
+            self._text_cache.move_to_end(key)
+        return surface
+
+    def _render_background(self):
+        """重新绘制静态背景：黑色背景 + Base Link 坐标系 + 缩放提示"""
+        self._bg.fill((0, 0, 0)) # 黑色背景
+
+        # 零点位置，无旋转
+        self.draw_coordinate_frame(
+            position=self._base_pos, 
+            quaternion=self._base_quat, 
+            color=(100, 100, 255), # 浅蓝
+            length=0.7, # 轴长度 0.7m
+            name="base_Link",
+            surface=self._bg
+        )
+
+        zoom_text = f"Zoom/Scale: {self.scale_factor/200.0:.2f}x (W/S or Up/Down)"
+        self._bg.blit(self._render_text(zoom_text, (200, 200, 200)), (10, 70))
+        self._base_pos_2d = self.project_3d_to_2d(self._base_pos)
+        self._bg_dirty = False
 
     def handle_input(self):
-        """处理用户输入，包括退出和缩放"""
-        for event in pygame.event.get():
+        """处理用户输入，包括退出、缩放和窗口重新露出"""
+        for event in pygame.event.get(list(self.HANDLED_EVENTS)):
             if event.type == pygame.QUIT:
                 self.running = False
                 return 
             
+            if event.type in self.EXPOSE_EVENTS:
+                # 窗口被遮挡后重新露出，下一帧整屏刷新
+                self._bg_dirty = True
+            
             if event.type == pygame.KEYDOWN:
                 # 放大 (W键 或 Up Arrow)
                 if event.key == pygame.K_w or event.key == pygame.K_UP:
                     self.scale_factor += self.zoom_step
+                    self._bg_dirty = True
                     logger.info(f"缩放: 放大到 {self.scale_factor:.2f}")
                 # 缩小 (S键 或 Down Arrow)
                 if event.key == pygame.K_s or event.key == pygame.K_DOWN:
                     if self.scale_factor > self.zoom_step:
                         self.scale_factor -= self.zoom_step
+                        self._bg_dirty = True
                         logger.info(f"缩放: 缩小到 {self.scale_factor:.2f}")
 
     def update(self, tracker_position, tracker_rotation):
-        """更新显示，绘制 Base Link 和 Tracker 坐标系"""
-        self.handle_input()
+        """更新显示，绘制 Base Link 和 Tracker 坐标系 (用户输入由主循环调用 handle_input 处理)"""
         if not self.running:
             return 
 
-        self.screen.fill((0, 0, 0)) # 黑色背景
-        
-        # --- 1. 绘制 Base Link 坐标系 (零点) ---
-        # 零点位置，无旋转
-        base_pos = [0.0, 0.0, 0.0]
-        base_quat = [0.0, 0.0, 0.0, 1.0] 
-        self.draw_coordinate_frame(
-            position=base_pos, 
-            quaternion=base_quat, 
-            color=(100, 100, 255), # 浅蓝
-            length=0.7, # 轴长度 0.7m
-            name="base_Link"
-        )
+        position = np.asarray(tracker_position, dtype=float)
+        rotation = np.asarray(tracker_rotation, dtype=float)
+        now = time.monotonic()
+        if (not self._bg_dirty and self._last_pos is not None
+                and now - self._last_draw_time < self.REDRAW_INTERVAL
+                and np.max(np.abs(position - self._last_pos)) < self.POSITION_EPSILON
+                and 1.0 - abs(np.dot(rotation, self._last_rot)) < self.ROTATION_EPSILON):
+            # 位姿几乎没有变化，跳过本帧绘制
+            return
+        self._last_pos, self._last_rot, self._last_draw_time = position, rotation, now
+
+        if self._bg_dirty:
+            # 缩放改变或窗口重新露出，重新绘制背景并整屏刷新
+            self._render_background()
+            self.screen.blit(self._bg, (0, 0))
+            dirty_rects = [self.screen.get_rect()]
+        else:
+            # 只用背景恢复上一帧动态内容覆盖的区域
+            dirty_rects = [self.screen.blit(self._bg, rect, rect) for rect in self._dirty_rects]
+
+        # --- 1. Base Link 坐标系 (零点) 已绘制在背景中 ---
         
         # --- 2. 绘制 Tracker 坐标系 (相对 Base Link) ---
         # tracker_position 和 tracker_rotation 本身就是相对于 Base Link (世界坐标系) 的位姿
-        self.draw_coordinate_frame(
+        tracker_rect = self.draw_coordinate_frame(
             position=tracker_position, 
             quaternion=tracker_rotation, 
             color=(255, 255, 0), # 黄色
@@ -149,26 +277,27 @@ class PygameVisualizer:
         )
         
         # 绘制 Base Link 到 Tracker 的连线 (更清晰地表示相对位置)
-        pos_2d_base = self.project_3d_to_2d(base_pos)
         pos_2d_tracker = self.project_3d_to_2d(tracker_position)
-        pygame.draw.line(self.screen, (150, 150, 150), pos_2d_base, pos_2d_tracker, 1)
+        tracker_rect.union_ip(pygame.draw.line(self.screen, (150, 150, 150), self._base_pos_2d, pos_2d_tracker, 1))
 
-        # 显示位姿信息
-        info_text = f"Position: ({tracker_position[0]:.4f}, {tracker_position[1]:.4f}, {tracker_position[2]:.4f}) (m)"
-        quat_text = f"Rotation (x, y, z, w): ({tracker_rotation[0]:.4f}, {tracker_rotation[1]:.4f}, {tracker_rotation[2]:.4f}, {tracker_rotation[3]:.4f})"
-        zoom_text = f"Zoom/Scale: {self.scale_factor/200.0:.2f}x (W/S or Up/Down)"
+        # 显示位姿信息 (数值每帧都在变化，降低文字刷新频率即可满足观察需要)
+        if self._info_surfaces is None or self._frame_count % self.INFO_TEXT_INTERVAL == 0:
+            info_text = f"Position: ({tracker_position[0]:.4f}, {tracker_position[1]:.4f}, {tracker_position[2]:.4f}) (m)"
+            quat_text = f"Rotation (x, y, z, w): ({tracker_rotation[0]:.4f}, {tracker_rotation[1]:.4f}, {tracker_rotation[2]:.4f}, {tracker_rotation[3]:.4f})"
+            # 数值几乎不会重复，直接渲染，不放入文字缓存
+            self._info_surfaces = (
+                self.font.render(info_text, True, (255, 255, 255)),
+                self.font.render(quat_text, True, (255, 255, 255)),
+            )
+        self._frame_count += 1
 
-        text_surface = self.font.render(info_text, True, (255, 255, 255))
-        self.screen.blit(text_surface, (10, 10))
-        
-        quat_surface = self.font.render(quat_text, True, (255, 255, 255))
-        self.screen.blit(quat_surface, (10, 40))
+        text_surface, quat_surface = self._info_surfaces
+        text_rect = self.screen.blit(text_surface, (10, 10))
+        text_rect.union_ip(self.screen.blit(quat_surface, (10, 40)))
 
-        zoom_surface = self.font.render(zoom_text, True, (200, 200, 200))
-        self.screen.blit(zoom_surface, (10, 70))
-        
-        pygame.display.flip()
-        self.clock.tick(60) # 保持60FPS
+        self._dirty_rects = [tracker_rect, text_rect]
+        dirty_rects.extend(self._dirty_rects)
+        pygame.display.update(dirty_rects)
         
     def is_running(self):
         return self.running
@@ -222,6 +351,10 @@ try:
             
             # 循环获取数据并更新可视化
             while viz.is_running(): 
+                viz.handle_input()
+                if not viz.is_running():
+                    break
+
                 pose = sense.get_pose(target_device)
                 
                 if pose:
@@ -230,10 +363,9 @@ try:
                     viz.update(position, rotation)
                 else:
                     logger.warning(f"未能获取{target_device}的位姿数据...")
-                    # 至少调用一次 update 来处理用户输入事件
                     viz.update([0.0, 0.0, 0.0], [0.0, 0.0, 0.0, 1.0])
                 
-                time.sleep(0.01)
+                viz.clock.tick(60) # 保持60FPS
             
         except Exception as e:
             logger.error(f"获取过程中发生错误: {e}")
@@ -247,4 +379,4 @@ try:
         
 except ImportError as e:
     logger.error(f"导入错误: {e}")
-    logger.error("请确保已安装所有必要的依赖：pysurvive 库、pika.sense 库 和 pygame 库")
\ No newline at end of file
+    logger.error("请确保已安装所有必要的依赖：pysurvive 库、pika.sense 库 和 pygame 库 (可选：numba 库，用于加速坐标系计算)")
\ No newline at end of file
@@ -6,6 +6,7 @@
 """
 
 import threading
+import queue
 import time
 import json
 import serial
@@ -13,10 +14,26 @@ import logging
 import re # 导入re模块用于正则表达式
 import struct # 导入struct模块
 
+try:
+    import orjson as _json # 优先使用更快的orjson解析，可直接解析bytes
+except ImportError:
+    _json = json
+
 # 配置日志
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
 logger = logging.getLogger("pika.serial_comm")
 
+# JSON分帧时只关心的结构字符: 转义序列(整体跳过)、双引号、花括号
+_JSON_TOKEN = re.compile(rb'\\.|["{}]', re.DOTALL)
+# 设备上报的JSON中可能带有多余的逗号
+_TRAIL_OBJ = re.compile(r',\s*}')
+_TRAIL_ARR = re.compile(r',\s*\]')
+# 命令帧格式: 命令类型(1字节) + 命令值(4字节) + 结束符\r\n
+_PACK_CMD_LE_F = struct.Struct('<Bf2s').pack # 小端序float
+_PACK_CMD_BE_I = struct.Struct('>Bi2s').pack # 大端序int
+# 分发线程的停止信号 (不能用None，JSON中的null解析后也是None)
+_STOP = object()
+
 class SerialComm:
     """
     串口通信类，负责与设备的串口通信
@@ -26,6 +43,9 @@ class SerialComm:
         baudrate (int): 波特率，默认为460800
         timeout (float): 超时时间，默认为1.0秒
     """
+    MAX_BUFFER_SIZE = 2000 # 接收缓冲区上限(字节)，未解析出数据且超过此长度时清空
+    READ_CHUNK_SIZE = 4096 # 单次读取的最大字节数
+    
     def __init__(self, port=r"/dev/ttyUSB0", baudrate=460800, timeout=1.0):
         self.port = port
         self.baudrate = baudrate
@@ -34,9 +54,11 @@ class SerialComm:
         self.is_connected = False
         self.reading_thread = None
         self.stop_thread = False
-        self.buffer = ""
+        self.buffer = bytearray()
         self.callback = None
-        self.data_lock = threading.Lock()
+        self.dispatch_thread = None
+        self.enable_poll = False
+        self.data_queue = queue.Queue()
         self.latest_data = {}
     
     def connect(self):
@@ -73,12 +95,13 @@ class SerialComm:
             self.is_connected = False
             logger.info(f"已断开串口设备连接: {self.port}")
     
-    def send_data(self, data):
+    def send_data(self, data, wait=False):
         """
         发送数据到串口
         
         参数:
             data (bytes): 要发送的数据
+            wait (bool): 是否等待数据全部发送完成，默认为False（写入系统缓冲区后立即返回）
             
         返回:
             bool: 发送是否成功
@@ -89,7 +112,8 @@ class SerialComm:
         
         try:
             self.serial.write(data)
-            self.serial.flush()
+            if wait:
+                self.serial.flush()
             return True
         except serial.SerialException as e:
             logger.error(f"发送数据失败: {e}")
@@ -108,21 +132,13 @@ class SerialComm:
             bool: 发送是否成功
         """ 
         try:
-            # 构建命令数据
-            data = bytearray()
-            data.append(command_type)  # 命令类型
-            
+            # 构建命令数据: 命令类型 + 命令值 + 结束符 \r\n
             if big_endian:
-                value_bytes = bytearray(struct.pack('>i', value))  # 大端序
+                data = _PACK_CMD_BE_I(command_type, value, b'\r\n')  # 大端序
             else:
-                value_bytes = bytearray(struct.pack('<f', value))  # 小端序
+                data = _PACK_CMD_LE_F(command_type, value, b'\r\n')  # 小端序
             
-            data.extend(value_bytes)
-            
-            # 添加结束符 \r\n
-            data.extend(b'\r\n')
-            
-            return self.send_data(data)
+            return self.send_data(data, wait=False)
         except Exception as e:
             logger.error(f"构建命令数据失败: {e}")
             return False
@@ -139,14 +155,14 @@ class SerialComm:
             command = 'GET_INFO\r\n'
             data = command.encode('utf-8')
             
-            return self.send_data(data)
+            return self.send_data(data, wait=False)
         except Exception as e:
             logger.error(f"发送GET_INFO命令失败: {e}")
             return False
         
     def read_data(self):
         """
-        从串口读取数据
+        从串口读取数据，没有数据时阻塞等待，最长等待timeout秒
         
         返回:
             bytes: 读取到的数据
@@ -156,9 +172,17 @@ class SerialComm:
             return b''
         
         try:
-            if self.serial.in_waiting > 0:
-                return self.serial.read(self.serial.in_waiting)
-            return b''
+            waiting = self.serial.in_waiting
+            if waiting > 0:
+                # 已有数据时一次性全部取走
+                return self.serial.read(min(waiting, self.READ_CHUNK_SIZE))
+            # 阻塞等待数据到达，由串口驱动唤醒，不需要轮询休眠
+            data = self.serial.read(1)
+            waiting = self.serial.in_waiting if data else 0
+            if waiting > 0:
+                # 再一次性取走已经到达的剩余数据
+                data += self.serial.read(min(waiting, self.READ_CHUNK_SIZE - 1))
+            return data
         except serial.SerialException as e:
             logger.error(f"读取数据失败: {e}")
             return b''
@@ -178,7 +202,7 @@ class SerialComm:
                 data = self.read_data()
                 if data:
                     # 将读取到的数据添加到缓冲区
-                    self.buffer += data.decode('utf-8', errors='ignore')
+                    self.buffer.extend(data)
                     # # 查找完整的JSON对象
                     # json_data = self._find_json()
                     # if json_data:
@@ -202,75 +226,112 @@ class SerialComm:
                     #   如果系统的实时性不够, 可能会一次性读取到几帧数据, 如果只处理第一帧数据, 剩余帧数据留到下次处理, 那么时间累积会导致无法处理到最新的数据, 响应就会严重滞后
 
                     # 查找所有完整的JSON对象
-                    json_datas = self._find_all_json()
+                    json_datas = self._find_all_json_lines()
                     if json_datas:
-                        for json_data in json_datas:
-                            # 如果设置了回调函数，则调用回调函数
-                            if self.callback:
-                                self.callback(json_data)
-                        # 更新最新数据
-                        with self.data_lock:
-                            self.latest_data = json_datas[-1]
-                    # 缓冲区数据长度大于2000字节就将其清空
-                    else:
-                        if len(self.buffer) > 2000:
-                            self.buffer = ""
-
-                # 短暂休眠，避免CPU占用过高
-                time.sleep(0.001)
+                        # 放入队列交给分发线程(回调函数)或 poll() 处理，解析不会被回调函数阻塞
+                        if self.callback or self.enable_poll:
+                            for json_data in json_datas:
+                                self.data_queue.put_nowait(json_data)
+                        # 更新最新数据 (单次属性赋值是原子操作，不需要加锁)
+                        self.latest_data = json_datas[-1]
+                    # 缓冲区数据长度大于MAX_BUFFER_SIZE字节就将其清空
+                    elif len(self.buffer) > self.MAX_BUFFER_SIZE:
+                        self.buffer.clear()
             except Exception as e:
                 logger.error(f"读取线程异常: {e}")
                 time.sleep(0.1)
         
         logger.info("串口读取线程已停止")
     
+    def _parse_json(self, json_bytes):
+        """
+        解析一帧JSON数据
+
+        参数:
+            json_bytes (bytes): 一帧完整的JSON数据
+
+        返回:
+            dict: 解析后的JSON对象，解析失败时抛出json.JSONDecodeError
+        """
+        try:
+            return _json.loads(json_bytes)
+        except ValueError:
+            pass
+        # 解析失败时再清理后重试
+        json_str = json_bytes.decode('utf-8', errors='ignore')
+        # --- 关键修改：处理多余的逗号 ---
+        cleaned_json_str = _TRAIL_ARR.sub(']', _TRAIL_OBJ.sub('}', json_str))
+        return json.loads(cleaned_json_str)
+
+    def _find_all_json_lines(self):
+        """
+        按行查找缓冲区中所有完整的JSON对象
+
+        设备每帧JSON以换行结尾时，直接按换行符切分并解析，不需要逐个匹配花括号；
+        如果缓冲区中还没有换行符，或某一行不是一个完整的JSON对象(如刚连接时的半帧数据)，
+        则本次退回到 _find_all_json 处理
+
+        返回: 返回包含所有json对象的列表
+        """
+        end = self.buffer.rfind(b'\n')
+        if end == -1:
+            return self._find_all_json()
+        json_datas = []
+        for line in self.buffer[:end].split(b'\n'):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                json_data = self._parse_json(line)
+            except ValueError:
+                return self._find_all_json()
+            # 只接受JSON对象，数字、字符串、数组、null等交给花括号匹配处理
+            if not isinstance(json_data, dict):
+                return self._find_all_json()
+            json_datas.append(json_data)
+        del self.buffer[:end + 1]
+        return json_datas
+
     def _find_all_json(self):
         """
         在缓冲区中查找所有完整的JSON对象
 
+        只对结构字符做一次线性扫描，用深度计数匹配花括号，并跳过字符串中的内容；
+        已解析的数据及对象之间的无效数据会从缓冲区头部删除，不完整的对象保留到下次处理
+
         返回: 返回包含所有json对象的列表
         """
         json_datas = []
+        buf = self.buffer
+        depth = 0
+        in_string = False
+        start = 0
         try:
-            msg = self.buffer
-            left_indices = [match.start() for match in re.finditer('{', msg)]
-            right_indices = [match.start() for match in re.finditer('}', msg)]
-            if len(left_indices) == 0 or len(right_indices) == 0:
-                return json_datas
-            if left_indices[0] > right_indices[0]:
-                return json_datas
-            json_start = left_indices[0]
-            json_end = None
-            json_str = None
-            json_str_list = []
-            for i in range(1, len(left_indices)):
-                if i > len(right_indices):
-                    break
-                if left_indices[i] > right_indices[i-1]:
-                    json_end = right_indices[i-1]
-                    json_str = msg[json_start:json_end+1]
-                    json_str_list.append(json_str)
-                    self.buffer = msg[json_end+1:]
-                    json_start = left_indices[i]
-                elif i == len(left_indices) - 1 and i < len(right_indices):
-                    if left_indices[i] < right_indices[i]:
-                        json_end = right_indices[i]
-                        json_str = msg[json_start:json_end+1]
-                        json_str_list.append(json_str)
-                        self.buffer = msg[json_end+1:]
-            for json_str in json_str_list:
-                # --- 关键修改：处理多余的逗号 ---
-                cleaned_json_str = re.sub(r',\s*}', '}', json_str)
-                cleaned_json_str = re.sub(r',\s*\]', ']', cleaned_json_str)
-                json_datas.append(json.loads(cleaned_json_str))
-            return json_datas
-        except json.JSONDecodeError as e:
-            logger.error(f"JSON解析错误: {e}")
-            self.buffer = ""  # 跳过错误的开始位置
+            for match in _JSON_TOKEN.finditer(buf):
+                token = match.group()
+                if in_string:
+                    if token == b'"':
+                        in_string = False
+                elif token == b'"':
+                    # 对象外的引号视为无效数据
+                    in_string = depth > 0
+                elif token == b'{':
+                    if depth == 0:
+                        start = match.start()
+                    depth += 1
+                elif token == b'}' and depth > 0:
+                    depth -= 1
+                    if depth == 0:
+                        try:
+                            json_datas.append(self._parse_json(buf[start:match.end()]))
+                        except json.JSONDecodeError as e:
+                            logger.error(f"JSON解析错误: {e}")
+            # 没有未完成的对象时，剩余数据中不含'{'，可以全部丢弃
+            del buf[:start if depth > 0 else len(buf)]
             return json_datas
         except Exception as e:
             logger.error(f"通信Json异常: {e}")
-            self.buffer = ""
+            buf.clear()
             return json_datas
 
     def _find_json(self):
@@ -282,53 +343,69 @@ class SerialComm:
         """
         try:
             # 查找JSON对象的开始和结束位置
-            start = self.buffer.find('{')
+            start = self.buffer.find(b'{')
             if start == -1:
-                self.buffer = ""
+                self.buffer.clear()
                 return None
             
             # 使用栈来匹配括号
             stack = []
             for i in range(start, len(self.buffer)):
-                if self.buffer[i] == '{':
+                if self.buffer[i] == 0x7B: # '{'
                     stack.append(i)
-                elif self.buffer[i] == '}':
+                elif self.buffer[i] == 0x7D: # '}'
                     if stack:
                         stack.pop()
                         if not stack:  # 找到完整的JSON对象
-                            json_str = self.buffer[start:i+1]
-                            self.buffer = self.buffer[i+1:]
+                            json_bytes = bytes(self.buffer[start:i+1])
+                            del self.buffer[:i+1]
                             
-                            # --- 关键修改：处理多余的逗号 ---
-                            cleaned_json_str = re.sub(r',\s*}', '}', json_str)
-                            cleaned_json_str = re.sub(r',\s*\]', ']', cleaned_json_str)
-                            
-                            return json.loads(cleaned_json_str)
+                            return self._parse_json(json_bytes)
             
             # 如果没有找到完整的JSON对象，保留缓冲区
             return None
         except json.JSONDecodeError as e:
             # logger.error(f"JSON解析错误: {e}")
-            self.buffer = ""  # 跳过错误的开始位置
+            self.buffer.clear()  # 跳过错误的开始位置
             return None
         except Exception as e:
             logger.error(f"通信Json异常: {e}")
-            self.buffer = ""
+            self.buffer.clear()
             return None
     
-    def start_reading_thread(self, callback=None):
+    def _dispatch_thread_func(self, data_queue):
+        """
+        分发线程函数，按接收顺序把读取线程解析出的数据交给回调函数
+        """
+        while True:
+            json_data = data_queue.get()
+            if json_data is _STOP: # 停止信号
+                break
+            try:
+                self.callback(json_data)
+            except Exception as e:
+                logger.error(f"回调函数异常: {e}")
+    
+    def start_reading_thread(self, callback=None, enable_poll=False):
         """
         启动读取线程
         
         参数:
-            callback (callable): 数据回调函数，接收解析后的JSON对象
+            callback (callable): 数据回调函数，接收解析后的JSON对象，在单独的分发线程中调用
+            enable_poll (bool): 是否缓存每一帧数据供 poll() 取出，默认为False；设置了回调函数时数据只交给回调函数
         """
         if self.reading_thread and self.reading_thread.is_alive():
             logger.warning("读取线程已经在运行")
             return
         
         self.callback = callback
+        self.enable_poll = enable_poll
+        self.data_queue = queue.Queue()
         self.stop_thread = False
+        if callback:
+            self.dispatch_thread = threading.Thread(target=self._dispatch_thread_func, args=(self.data_queue,))
+            self.dispatch_thread.daemon = True
+            self.dispatch_thread.start()
         self.reading_thread = threading.Thread(target=self._reading_thread_func)
         self.reading_thread.daemon = True
         self.reading_thread.start()
@@ -339,18 +416,53 @@ class SerialComm:
         """
         self.stop_thread = True
         if self.reading_thread and self.reading_thread.is_alive():
+            # 唤醒阻塞在串口读取上的线程
+            if self.serial and hasattr(self.serial, 'cancel_read'):
+                self.serial.cancel_read()
             self.reading_thread.join(timeout=1.0)
             logger.info("读取线程已停止")
+        if self.dispatch_thread and self.dispatch_thread.is_alive():
+            # 队列中剩余的数据分发完后退出
+            self.data_queue.put_nowait(_STOP)
+            if threading.current_thread() is not self.dispatch_thread:
+                self.dispatch_thread.join(timeout=1.0)
+    
+    def poll(self):
+        """
+        取出读取线程解析到、尚未取出的所有数据
+        
+        需要在 start_reading_thread 时设置 enable_poll=True 且不设置回调函数
+        
+        返回:
+            list: 按接收顺序排列的JSON对象列表
+        """
+        json_datas = []
+        try:
+            while True:
+                json_datas.append(self.data_queue.get_nowait())
+        except queue.Empty:
+            return json_datas
     
     def get_latest_data(self):
         """
         获取最新的数据
         
+        读取线程每次都会替换为新的对象，而不会修改已发布的对象，因此直接返回引用；
+        返回值应视为只读，需要修改时请使用 get_latest_data_copy()
+        
         返回:
             dict: 最新的数据
         """
-        with self.data_lock:
-            return self.latest_data.copy()
+        return self.latest_data
+    
+    def get_latest_data_copy(self):
+        """
+        获取最新数据的副本，可以自由修改
+        
+        返回:
+            dict: 最新数据的副本
+        """
+        return self.latest_data.copy()
     
     def __del__(self):
         """
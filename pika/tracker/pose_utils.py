@@ -21,6 +21,28 @@ def xyzQuaternion2matrix(x, y, z, qx, qy, qz, qw):
     
     return rot_matrix
 
+# 辅助函数：将N个四元数批量转换为3x3旋转矩阵
+def quaternions2matrices(quats):
+    """
+    将N个 [x, y, z, w] 四元数批量转换为 (N, 3, 3) 的旋转矩阵
+    按列取出各分量后逐元素计算，N个四元数只需要一次向量化计算
+    """
+    quats = np.asarray(quats, dtype=float)
+    qx, qy, qz, qw = quats[:, 0], quats[:, 1], quats[:, 2], quats[:, 3]
+    
+    rot_matrices = np.empty((quats.shape[0], 3, 3))
+    rot_matrices[:, 0, 0] = 1 - 2*(qy*qy + qz*qz)
+    rot_matrices[:, 0, 1] = 2*(qx*qy - qz*qw)
+    rot_matrices[:, 0, 2] = 2*(qx*qz + qy*qw)
+    rot_matrices[:, 1, 0] = 2*(qx*qy + qz*qw)
+    rot_matrices[:, 1, 1] = 1 - 2*(qx*qx + qz*qz)
+    rot_matrices[:, 1, 2] = 2*(qy*qz - qx*qw)
+    rot_matrices[:, 2, 0] = 2*(qx*qz - qy*qw)
+    rot_matrices[:, 2, 1] = 2*(qy*qz + qx*qw)
+    rot_matrices[:, 2, 2] = 1 - 2*(qx*qx + qy*qy)
+    
+    return rot_matrices
+
 # 辅助函数：将xyz位置和rpy角度转换为4x4变换矩阵
 def xyzrpy2Mat(x, y, z, roll, pitch, yaw):
     """
@@ -37,6 +37,7 @@ SOFTWARE.
         "numpy",
         "opencv-python",
         "pyserial",
+        "orjson",
         "pyrealsense2",
         "pysurvive",
         "wxpython",